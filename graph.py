@@ -5,8 +5,11 @@ for searching for a Hamiltonian cycle
 """
 
 from __future__ import annotations
-from typing import Any, List
-from queue import Queue
+import sys
+from typing import Any, Callable, List
+from array import array
+from collections import deque
+from operator import itemgetter
 from random import choice
 
 
@@ -14,66 +17,106 @@ class Graph:
     """an undirected graph class implemented through a dictionary"""
 
     class Node:
-        """node class storing node value and incident edges"""
+        """node class storing node value and (adjacent node, weight) pairs"""
 
-        def __init__(self, value: Any):
-            self.value = value
-            self.edges = set()
-            self.parents = {}
-
-        def __ne__(self, other) -> bool:
-            if not isinstance(other, type(self)):
-                return True
+        __slots__ = ("value", "idx", "adj", "_hash")
 
-            return self.value != other.value
+        def __init__(self, value: Any, idx: int):
+            self.value = value
+            self.idx = idx
+            self.adj = []
+            self._hash = hash(value)
 
         def __eq__(self, other) -> bool:
-            if not isinstance(other, type(self)):
-                return False
-
-            return self.value == other.value
+            # nodes are unique per value, see Graph.add_or_get_node
+            return self is other
 
         def __hash__(self) -> int:
-            return hash(self.value)
+            return self._hash
 
         def __repr__(self) -> str:
             return f"<Node: {self.value=}>"
 
-    class Edge:
-        """edge class storing the incident node"""
-
-        def __init__(self, incident_node, weight: int):
-            self.incident_node = incident_node
-            self.weight = weight
-
-        def __lt__(self, other) -> bool:
-            return self.weight < other.weight
-
-        def __repr__(self):
-            return f"<Edge: {self.weight=}, {self.incident_node=}>"
-
-    def __init__(self, data_input: List[Any, Any, int]):
+    def __init__(self, data_input: List[Any, Any, Any]):
         self.graph = {}
         self.n_vertex = 0
+        self._nodes = []  # nodes in order of their idx
+        # adjacency bitmask and degree of each node, indexed by node.idx
+        self.adj_mask = []
+        self.deg = []
+        self._ore_cache = None
+        # CSR arrays and the nearest neighbour walk bound to them
+        self._csr = None
 
         for from_, to_, weight in data_input:
-            node = self.add_or_get_node(from_)
-            incident_node = self.add_or_get_node(to_)
-
-            edge = self.Edge(incident_node, weight)
-
-            node.edges.add(edge)
-            incident_node.parents[node] = edge
+            self.add_edge(from_, to_, weight)
 
     def add_or_get_node(self, value: Any) -> Node:
         """adding and returning a node"""
 
         if value not in self.graph:
-            self.graph[value] = self.Node(value)
+            self.graph[value] = self.Node(value, self.n_vertex)
+            self._nodes.append(self.graph[value])
+            self.adj_mask.append(0)
+            self.deg.append(0)
             self.n_vertex += 1
+            self._invalidate()
 
         return self.graph[value]
 
+    def add_edge(self, from_: Any, to_: Any, weight: Any) -> None:
+        """
+        adding an undirected edge, creating its nodes if necessary;
+        repeated edges, including the reversed ones, and loops are skipped
+        """
+
+        node = self.add_or_get_node(from_)
+        incident_node = self.add_or_get_node(to_)
+
+        i, j = node.idx, incident_node.idx
+        # a loop is never part of a Hamiltonian cycle and must not count
+        # towards the degree used by Ore's theorem
+        if i == j or (self.adj_mask[i] >> j) & 1:
+            return
+
+        node.adj.append((incident_node, weight))
+        incident_node.adj.append((node, weight))
+
+        self.adj_mask[i] |= 1 << j
+        self.adj_mask[j] |= 1 << i
+        self.deg[i] += 1
+        self.deg[j] += 1
+        self._invalidate()
+
+    def _invalidate(self) -> None:
+        """drops everything computed from the current nodes and edges"""
+
+        self._ore_cache = None
+        self._csr = None
+
+    def _get_csr(self) -> tuple:
+        """
+        returns the edges packed in flat arrays (indptr, indices, weights):
+        edges of the node with index u occupy indptr[u]:indptr[u + 1]
+        and are sorted by weight in ascending order
+        """
+
+        if self._csr is None:
+            # weights may be of any comparable type, so they stay in a list
+            indptr, indices, weights = array("l", [0]), array("l"), []
+            for node in self._nodes:
+                for adjacent_node, weight in sorted(node.adj,
+                                                    key=itemgetter(1)):
+                    indices.append(adjacent_node.idx)
+                    weights.append(weight)
+                indptr.append(len(indices))
+            self._csr = (
+                (indptr, indices, weights),
+                _make_nearest_neighbour_cycle(
+                    indptr, indices, weights, self.n_vertex))
+
+        return self._csr[0]
+
     def traverse(self, *, how="dfs") -> None:
         """
         wrapper for traversing all nodes of the graph
@@ -91,118 +134,165 @@ class Graph:
         else:
             raise ValueError("invalid argument value")
 
-        passed = set()
-        for node in self.graph.values():
-            if node not in passed:
-                traverse_(node, passed)
+        passed = bytearray(self.n_vertex)
+        out = []
+        for node in self._nodes:
+            if not passed[node.idx]:
+                traverse_(node, passed, out)
+
+        # visited nodes are collected and printed at once
+        if out:
+            sys.stdout.write("\n".join(map(str, out)) + "\n")
 
-    def _bfs(self, node: Node, passed: set) -> None:
+    def _bfs(self, node: Node, passed: bytearray, out: list) -> None:
         """breadth-first traversal with queue"""
 
-        queue = Queue()
-        queue.put(node)
-        while not queue.empty():
-            node = queue.get()
-            passed.add(node)
-            print(node)
-            for edge in node.edges:
-                if edge.incident_node not in passed:
-                    queue.put(edge.incident_node)
-                    passed.add(edge.incident_node)
-
-    def _dfs_without_recur(self, node: Node, passed: set) -> None:
+        indptr, indices, _ = self._get_csr()
+        nodes = self._nodes
+
+        queue = deque([node.idx])
+        passed[node.idx] = 1
+        while queue:
+            u = queue.popleft()
+            out.append(nodes[u])
+            for v in indices[indptr[u]:indptr[u + 1]]:
+                if not passed[v]:
+                    queue.append(v)
+                    passed[v] = 1
+
+    def _dfs_without_recur(self, node: Node, passed: bytearray,
+                           out: list) -> None:
         """depth-first traversal without recursion"""
 
-        stack = [node]
+        indptr, indices, _ = self._get_csr()
+        nodes = self._nodes
+
+        # each stack entry keeps its own cursor into the row of the node,
+        # so every edge is looked at once
+        out.append(node)
+        passed[node.idx] = 1
+        stack = [iter(indices[indptr[node.idx]:indptr[node.idx + 1]])]
         while stack:
-            node = stack[-1]
-            if node not in passed:
-                print(node)
-                passed.add(node)
-            has_children = False
-            for edge in node.edges:
-                if edge.incident_node not in passed:
-                    stack.append(edge.incident_node)
-                    has_children = True
+            for v in stack[-1]:
+                if not passed[v]:
+                    out.append(nodes[v])
+                    passed[v] = 1
+                    stack.append(iter(indices[indptr[v]:indptr[v + 1]]))
                     break
-            if not has_children:
+            else:
                 stack.pop()
 
-    def _dfs_with_recur(self, node: Node, passed: set) -> None:
+    def _dfs_with_recur(self, node: Node, passed: bytearray,
+                        out: list) -> None:
         """depth-first traversal with recursion"""
 
-        print(node.value)
-        passed.add(node)
-        for edge in node.edges:
-            if edge.incident_node not in passed:
-                self._dfs_with_recur(edge.incident_node, passed)
+        indptr, indices, _ = self._get_csr()
+
+        out.append(node.value)
+        passed[node.idx] = 1
+        for v in indices[indptr[node.idx]:indptr[node.idx + 1]]:
+            if not passed[v]:
+                self._dfs_with_recur(self._nodes[v], passed, out)
 
     def _ore_theorem(self) -> bool:
-        """verifies Ore's theorem"""
+        """verifies Ore's theorem, cached until the graph changes"""
+
+        if self._ore_cache is None:
+            self._ore_cache = self._check_ore_theorem()
+
+        return self._ore_cache
+
+    def _check_ore_theorem(self) -> bool:
+        """checks the condition of Ore's theorem"""
 
         if self.n_vertex < 3:
             return False
 
-        for node1 in self.graph.values():
-            for node2 in self.graph.values():
-                if node1 != node2 and \
-                    node2 not in node1.parents and \
-                    node1 not in node2.parents and \
-                        len(node1.edges) + len(node2.edges) < self.n_vertex:
-
-                    return False
+        n, adj_mask, deg = self.n_vertex, self.adj_mask, self.deg
+
+        # low_deg[t] is the bitmask of nodes with degree less than t
+        by_deg = [0] * n
+        for v, d in enumerate(deg):
+            if d < n:
+                by_deg[d] |= 1 << v
+        low_deg = [0]
+        for mask in by_deg:
+            low_deg.append(low_deg[-1] | mask)
+
+        # a pair (u, v), v > u, breaks the condition if v is not adjacent
+        # to u and has degree less than n - deg(u): test all v at once
+        full = (1 << n) - 1
+        for u in range(n):
+            threshold = n - deg[u]
+            if threshold <= 0:
+                continue
+            not_adjacent = ~adj_mask[u] & full & ~((2 << u) - 1)
+            if not_adjacent & low_deg[threshold]:
+                return False
 
         return True
 
-    def _weight_between_nodes(self, node: Node, adjacent_node: Node) -> int:
-        """return weight between adjacent nodes"""
+    def compile_nn(self) -> Callable[[int], tuple[list, Any]]:
+        """
+        returns the nearest neighbour walk bound to the current edges,
+        cached until the graph changes
+        """
 
-        if adjacent_node in node.parents:
-            return node.parents[adjacent_node].weight
+        self._get_csr()
+        return self._csr[1]
 
-        if node in adjacent_node.parents:
-            return node.parents[node].weight
+    def find_hamiltonian_cycle(self, *, start_node=None) -> Any:
+        """finds a suboptimal Hamiltonian cycle"""
 
-        raise ValueError("nodes are not adjacent")
+        if not self._ore_theorem():
+            return 0
 
-    def _nearest_not_passed_node(self, node: Node, passed: set) -> Node:
-        """returns the nearest unmarked node"""
+        if start_node is None:
+            start_node = choice(self._nodes)
 
-        edges_to_not_passed_nodes = filter(
-            lambda edge: edge.incident_node not in passed,
-            node.edges)
+        order, route_len = self.compile_nn()(start_node.idx)
 
-        edge_to_nearest_node = min(edges_to_not_passed_nodes)
+        parts = [str(self._nodes[u]) for u in order]
+        parts.append(str(start_node))
+        print(" -> ".join(parts))
+        return route_len
 
-        return edge_to_nearest_node.incident_node
 
-    def find_hamiltonian_cycle(self, *, start_node=None) -> int:
-        """finds a suboptimal Hamiltonian cycle"""
+def _make_nearest_neighbour_cycle(
+        indptr: array, indices: array, weights: list,
+        n_vertex: int) -> Callable[[int], tuple[list, Any]]:
+    """
+    returns a nearest neighbour walk over CSR arrays with rows sorted by
+    weight, the walk maps a start node index to the order of node indices
+    and the length of the cycle
+    """
 
-        if not self._ore_theorem():
-            return 0
+    def nearest_neighbour_cycle(start: int) -> tuple[list, Any]:
+        passed = bytearray(n_vertex)
+        passed[start] = 1
+        order = [start]
+        route_len = 0
 
-        if start_node is None:
-            start_node = choice(list(self.graph.values()))
+        cur = start
+        for _ in range(n_vertex - 1):
+            for k in range(indptr[cur], indptr[cur + 1]):
+                if not passed[indices[k]]:
+                    break
+            else:
+                raise ValueError("all adjacent nodes are marked")
 
-        route = f"{start_node}"
-        route_len = 0
+            cur = indices[k]
+            passed[cur] = 1
+            order.append(cur)
+            route_len += weights[k]
 
-        cur_node = start_node
-        passed = set()
-        passed.add(cur_node)
+        for k in range(indptr[cur], indptr[cur + 1]):
+            if indices[k] == start:
+                return order, route_len + weights[k]
 
-        while len(passed) != self.n_vertex:
-            nearest_node = self._nearest_not_passed_node(cur_node, passed)
-            route_len += self._weight_between_nodes(nearest_node, cur_node)
-            route += f" -> {nearest_node}"
-            passed.add(nearest_node)
-            cur_node = nearest_node
+        raise ValueError("nodes are not adjacent")
 
-        route += f" -> {start_node}"
-        route_len += self._weight_between_nodes(start_node, cur_node)
-        print(route)
-        return route_len
+    return nearest_neighbour_cycle
 
 
 # data = [